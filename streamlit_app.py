@@ -1,12 +1,24 @@
 import os
 import time
 import json
+import threading
+import orjson
 import requests
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import hmac
+from websockets.exceptions import ConnectionClosed, WebSocketException
+from websockets.sync.client import connect as ws_connect
 import boto3
+from boto3.s3.transfer import TransferConfig
+import numpy as np
+import pandas as pd
 import base64
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 # Set page configuration
@@ -15,23 +27,28 @@ st.set_page_config(page_title="CrewAI Document Processor", page_icon="🤖", lay
 # Custom CSS for styling
 st.markdown("""
 <style>
-.chat-role-user { color: #0068c9; font-weight: bold; display: inline; }
-.chat-role-ai { color: #ff4b4b; font-weight: bold; display: inline; }
-.chat-message { display: inline; margin-left: 8px; }
 .small-api-status { font-size: 14px; margin-top: -15px; margin-bottom: 15px; }
 .logo-container { position: relative; height: 60px; }
 .logo-image { position: absolute; top: 0; left: 0; height: 40px; }
 </style>
 """, unsafe_allow_html=True)
 
+# Expected credentials, read from secrets and encoded once per process
+@st.cache_resource
+def get_auth_credentials():
+    """Return the configured username and password as bytes."""
+    return st.secrets["auth"]["username"].encode("utf-8"), st.secrets["auth"]["password"].encode("utf-8")
+
 # Authentication function
 def check_password():
     """Returns `True` if the user had the correct password."""
 
     def password_entered():
         """Checks whether a password entered by the user is correct."""
-        if hmac.compare_digest(st.session_state["username"], st.secrets["auth"]["username"]) and \
-           hmac.compare_digest(st.session_state["password"], st.secrets["auth"]["password"]):
+        username, password = get_auth_credentials()
+        # Compare both fields as bytes without short-circuiting
+        if hmac.compare_digest(st.session_state["username"].encode("utf-8"), username) & \
+           hmac.compare_digest(st.session_state["password"].encode("utf-8"), password):
             st.session_state["password_correct"] = True
             # Delete password from session state
             del st.session_state["password"]
@@ -61,8 +78,45 @@ if not check_password():
 
 # If we get here, the user is authenticated
 API_URL = st.secrets["CRW_API_URL"]
+API_BASE = API_URL.rstrip("/")
+# Websocket endpoint for persistent chat sessions, derived from the API URL unless set explicitly
+WS_BASE = st.secrets.get("CRW_WS_URL", API_BASE.replace("http", "ws", 1)).rstrip("/")
 API_TOKEN = st.secrets["CRW_API_TOKEN"]
 
+# Shared HTTP session so API calls reuse pooled keep-alive connections across reruns
+@st.cache_resource
+def get_api_session():
+    """Create a pooled, authenticated session for the CrewAI API."""
+    session = requests.Session()
+    session.headers.update({
+        "Authorization": f"Bearer {API_TOKEN}",
+        "Content-Type": "application/json"
+    })
+    # Retry only failed connects; retrying read timeouts would multiply the 30s read limit
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=Retry(total=2, connect=2, read=0, backoff_factor=0.1)
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+SESSION = get_api_session()
+
+# Separate session for health checks with retries disabled, so their timeout is the real limit
+@st.cache_resource
+def get_health_session():
+    """Create an authenticated session for the CrewAI API that never retries."""
+    session = requests.Session()
+    session.headers.update({"Authorization": f"Bearer {API_TOKEN}"})
+    adapter = HTTPAdapter(max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+HEALTH_SESSION = get_health_session()
+
 # AWS Credentials from secrets
 AWS_ACCESS_KEY_ID = st.secrets["AWS_ACCESS_KEY_ID"]
 AWS_SECRET_ACCESS_KEY = st.secrets["AWS_SECRET_ACCESS_KEY"]
@@ -76,42 +130,54 @@ if "processing" not in st.session_state:
     st.session_state.processing = False
 if "kickoff_id" not in st.session_state:
     st.session_state.kickoff_id = None
+if "process_state" not in st.session_state:
+    st.session_state.process_state = None
 if "upload_complete" not in st.session_state:
     st.session_state.upload_complete = False
 if "chat_messages" not in st.session_state:
     st.session_state.chat_messages = []
 if "chat_id" not in st.session_state:
     st.session_state.chat_id = None
+if "chat_ws" not in st.session_state:
+    st.session_state.chat_ws = None
+if "chat_ws_supported" not in st.session_state:
+    st.session_state.chat_ws_supported = True
+if "chat_stream_supported" not in st.session_state:
+    st.session_state.chat_stream_supported = True
+if "chat_wait_supported" not in st.session_state:
+    st.session_state.chat_wait_supported = True
 if "should_clear_input" not in st.session_state:
     st.session_state.should_clear_input = False
 
 # No duplicate import needed as base64 is already imported at the top
 
-# Check API health function
+# Check API health function, cached briefly so reruns don't hit the API every time
+@st.cache_data(ttl=10, show_spinner=False)
 def check_api_health():
     """Check if the CrewAI API is healthy using the status endpoint"""
     try:
-        # First try checking status endpoint
-        url = f"{API_URL}/status".rstrip("/")
-        response = requests.get(url, headers={"Authorization": f"Bearer {API_TOKEN}"})
-        
-        # If status endpoint returns any response (even error), API is likely running
-        if response.status_code < 500:
-            return True
-            
-        # If status fails, try root endpoint as fallback
-        root_response = requests.get(API_URL, headers={"Authorization": f"Bearer {API_TOKEN}"})
-        return root_response.status_code < 500
+        # Any response from the status endpoint (even an error) means the API is running,
+        # so stop at the response headers; a hung server is reported unavailable after 2s
+        url = f"{API_BASE}/status"
+        with HEALTH_SESSION.get(url, timeout=(1.0, 2.0), stream=True) as response:
+            return response.status_code < 500
     except:
         # If connection completely fails, API is not available
         return False
 
+# Encode the logo once per process instead of on every rerun
+@st.cache_resource
+def get_logo_base64():
+    """Return the CrewAI logo SVG as a base64 string."""
+    with open("crewai_logo.svg", "rb") as logo_file:
+        return base64.b64encode(logo_file.read()).decode("utf-8")
+
 # Logo and title container
 st.markdown("""
 <div class="logo-container">
     <img src="data:image/svg+xml;base64,{}" class="logo-image">
 </div>
-""".format(base64.b64encode(open("crewai_logo.svg", "rb").read()).decode("utf-8")), unsafe_allow_html=True)
+""".format(get_logo_base64()), unsafe_allow_html=True)
 
 # Main app title
 st.title("CrewAI Document Processor")
@@ -129,27 +195,235 @@ with status_col2:
 # Function to make authenticated API requests
 def api_request(endpoint, method="GET", data=None):
     """Make an authenticated request to the CrewAI API"""
-    url = f"{API_URL}/{endpoint}".rstrip("/")
-    headers = {
-        "Authorization": f"Bearer {API_TOKEN}",
-        "Content-Type": "application/json"
-    }
+    url = f"{API_BASE}/{endpoint}" if endpoint else API_BASE
     
     try:
         if method == "GET":
-            response = requests.get(url, headers=headers)
+            response = SESSION.get(url, timeout=(3, 30))
         elif method == "POST":
-            response = requests.post(url, headers=headers, json=data)
+            response = SESSION.post(url, json=data, timeout=(3, 30))
         else:
             raise ValueError(f"Unsupported HTTP method: {method}")
         
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return orjson.loads(response.content)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         st.error(f"API request failed: {str(e)}")
         return None
 
+# Poll a kickoff until it reaches a final state
+def poll_until(kickoff_id, deadline_s):
+    """Poll the status endpoint with exponential backoff until the kickoff finishes.
+    
+    A SUCCESS state only counts as finished once its `result` is set. Returns the
+    final status data, the last non-final status if `deadline_s` seconds pass first,
+    or None if the status request fails.
+    """
+    deadline = time.time() + deadline_s
+    delay = 0.02
+    status_data = None
+    while time.time() < deadline:
+        status_data = api_request(f"status/{kickoff_id}")
+        if status_data is None:
+            return None
+        if status_data.get("state") == "SUCCESS" and status_data.get("result"):
+            return status_data
+        if status_data.get("state") in ["FAILURE", "TIMEOUT"]:
+            return status_data
+        time.sleep(delay)
+        delay = min(delay * 1.7, 1.0)
+    return status_data
+
+# Chat response helpers
+def poll_chat_result(input_data):
+    """Kickoff the chat and poll status until the result is ready; returns the parsed result or None."""
+    # Step 1: Kickoff the request to get kickoff_id
+    kickoff_response = api_request("kickoff", method="POST", data=input_data)
+    
+    if not (kickoff_response and "kickoff_id" in kickoff_response):
+        st.error("Failed to get a kickoff ID from the API")
+        if kickoff_response:
+            st.error(f"Received: {kickoff_response}")
+        return None
+    
+    # Get the kickoff_id from the response
+    kickoff_id = kickoff_response["kickoff_id"]
+    
+    # Step 2: Wait for the result with the kickoff_id
+    status_response = poll_until(kickoff_id, deadline_s=60)
+    
+    if status_response and status_response.get("state") == "SUCCESS" and status_response.get("result"):
+        # Parse the result which is a JSON string
+        return orjson.loads(status_response["result"])
+    elif status_response and status_response.get("state") in ["FAILURE", "TIMEOUT"]:
+        st.error(f"Request failed with state: {status_response.get('state')}")
+    elif status_response:
+        st.error("Timed out waiting for response")
+    return None
+
+def wait_chat(input_data):
+    """Fallback for APIs without streaming: get the full chat response in one piece.
+    
+    Uses the blocking `kickoff_wait` endpoint, which returns the result JSON in a
+    single round-trip. Falls back to kickoff + status polling when it is not available.
+    """
+    if st.session_state.chat_wait_supported:
+        url = f"{API_BASE}/kickoff_wait"
+        response = SESSION.post(url, json=input_data, timeout=(3, 60))
+        # Remember a missing endpoint so later turns go straight to polling
+        if response.status_code == 404:
+            st.session_state.chat_wait_supported = False
+    
+    if st.session_state.chat_wait_supported:
+        response.raise_for_status()
+        result_data = orjson.loads(response.content)
+    else:
+        result_data = poll_chat_result(input_data)
+    
+    if result_data is None:
+        return
+    
+    # Update the chat_id for future messages
+    if result_data.get("id"):
+        st.session_state.chat_id = result_data["id"]
+    
+    yield result_data.get("response", "")
+
+def stream_chat(input_data):
+    """Stream the AI response for a chat turn, yielding text chunks as they arrive.
+    
+    Reads Server-Sent Events from the `kickoff_stream` endpoint. Each `data:` line
+    carries a JSON object with a `response` text chunk and/or the chat `id`.
+    Falls back to waiting for the full response when the endpoint is not available.
+    """
+    if not st.session_state.chat_stream_supported:
+        yield from wait_chat(input_data)
+        return
+    
+    url = f"{API_BASE}/kickoff_stream"
+    headers = {"Accept": "text/event-stream"}
+    
+    # Connect timeout plus a per-chunk read timeout so a stalled stream never hangs the page
+    with SESSION.post(url, headers=headers, json=input_data, stream=True, timeout=(3, 30)) as response:
+        # Remember a missing endpoint so later turns skip straight to the fallback
+        if response.status_code == 404:
+            st.session_state.chat_stream_supported = False
+            yield from wait_chat(input_data)
+            return
+        response.raise_for_status()
+        
+        # SSE is always UTF-8, so read raw bytes rather than trusting response.encoding,
+        # which falls back to ISO-8859-1 when the content type carries no charset
+        for line in response.iter_lines():
+            # Skip keep-alive blank lines, comments and non-data fields
+            if not line or not line.startswith(b"data:"):
+                continue
+            payload = line[len(b"data:"):].strip()
+            if payload == b"[DONE]":
+                break
+            
+            event = orjson.loads(payload)
+            if event.get("id"):
+                st.session_state.chat_id = event["id"]
+            if event.get("response"):
+                yield event["response"]
+
+# Close chat websockets unused for this long, so abandoned browser sessions don't hold them open
+CHAT_WS_IDLE_SECONDS = 300
+
+@st.cache_resource
+def get_chat_socket_registry():
+    """Track when each open chat websocket was last used, across all sessions."""
+    return {"lock": threading.Lock(), "last_used": {}}
+
+def touch_chat_socket(chat_socket):
+    """Record that a chat websocket was just used."""
+    registry = get_chat_socket_registry()
+    with registry["lock"]:
+        registry["last_used"][chat_socket] = time.time()
+
+def close_idle_chat_sockets():
+    """Close chat websockets from any session that have been idle too long."""
+    registry = get_chat_socket_registry()
+    now = time.time()
+    with registry["lock"]:
+        idle = [ws for ws, last_used in registry["last_used"].items() if now - last_used > CHAT_WS_IDLE_SECONDS]
+        for ws in idle:
+            del registry["last_used"][ws]
+    for ws in idle:
+        ws.close()
+
+def get_chat_socket():
+    """Return the websocket for the current chat session, or None to use the HTTP path.
+    
+    A socket is only opened at the start of a conversation: `chat/open` creates the
+    server-side session and returns its `id`, then a websocket to `chat/{id}` is kept
+    in session state for the following turns. If negotiation fails once, the session
+    sticks to the HTTP path.
+    """
+    close_idle_chat_sockets()
+    
+    if st.session_state.chat_ws is not None:
+        return st.session_state.chat_ws
+    if st.session_state.chat_id is not None or not st.session_state.chat_ws_supported:
+        return None
+    
+    try:
+        response = SESSION.post(f"{API_BASE}/chat/open", timeout=(3, 30))
+        response.raise_for_status()
+        chat_id = orjson.loads(response.content)["id"]
+        st.session_state.chat_ws = ws_connect(
+            f"{WS_BASE}/chat/{chat_id}",
+            additional_headers={"Authorization": f"Bearer {API_TOKEN}"},
+            open_timeout=3,
+            # Kept open across reruns, so connect directly rather than as a context manager
+            legacy=True
+        )
+        st.session_state.chat_id = chat_id
+        touch_chat_socket(st.session_state.chat_ws)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError, KeyError, WebSocketException, OSError):
+        st.session_state.chat_ws_supported = False
+        return None
+    
+    return st.session_state.chat_ws
+
+def close_chat_socket():
+    """Close the chat websocket, if one is open."""
+    if st.session_state.chat_ws is not None:
+        registry = get_chat_socket_registry()
+        with registry["lock"]:
+            registry["last_used"].pop(st.session_state.chat_ws, None)
+        st.session_state.chat_ws.close()
+        st.session_state.chat_ws = None
+
+def socket_chat(chat_socket, current_message, input_data):
+    """Send a chat turn over the session websocket, yielding text chunks as they arrive.
+    
+    Each frame received is a JSON object with a `response` text chunk; the last
+    frame of the turn has `done` set. If the socket is already closed when sending
+    (e.g. a proxy dropped the idle connection), the turn never reached the server,
+    so it is retried over HTTP with `input_data`. Failures after sending are raised.
+    """
+    try:
+        chat_socket.send(orjson.dumps({"current_message": current_message}).decode("utf-8"))
+    except ConnectionClosed:
+        close_chat_socket()
+        yield from stream_chat(input_data)
+        return
+    
+    touch_chat_socket(chat_socket)
+    while True:
+        event = orjson.loads(chat_socket.recv(timeout=30))
+        touch_chat_socket(chat_socket)
+        if event.get("response"):
+            yield event["response"]
+        if event.get("done"):
+            break
+
 # S3 utility functions
+# Up to 8 files upload at once with 4 parts each, matching the S3 client's 32 pooled connections
+S3_TRANSFER_CONFIG = TransferConfig(multipart_threshold=8 * 1024 * 1024, max_concurrency=4, use_threads=True)
+
 def parse_s3_uri(s3_uri):
     """Parse an S3 URI into bucket name and key."""
     parts = s3_uri.replace('s3://', '').split('/', 1)
@@ -157,69 +431,87 @@ def parse_s3_uri(s3_uri):
     prefix = parts[1] if len(parts) > 1 else ''
     return bucket, prefix
 
+@st.cache_resource
 def get_s3_client():
-    """Create and return an S3 client using credentials from secrets."""
+    """Create and return a shared S3 client using credentials from secrets."""
     try:
         s3_client = boto3.client(
             's3',
             aws_access_key_id=AWS_ACCESS_KEY_ID,
             aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=AWS_DEFAULT_REGION
+            region_name=AWS_DEFAULT_REGION,
+            config=Config(
+                max_pool_connections=32,
+                retries={"max_attempts": 3, "mode": "adaptive"},
+                tcp_keepalive=True
+            )
         )
         return s3_client
     except Exception as e:
         st.error(f"Error creating S3 client: {e}")
         raise
 
-def list_s3_files(s3_folder_uri):
-    """List all files in an S3 folder."""
-    try:
-        bucket, prefix = parse_s3_uri(s3_folder_uri)
-        s3_client = get_s3_client()
-        
-        # Ensure the prefix ends with a slash if it's not empty
-        if prefix and not prefix.endswith('/'):
-            prefix += '/'
-        
-        # Use paginator for buckets with many objects
-        paginator = s3_client.get_paginator('list_objects_v2')
-        response_iterator = paginator.paginate(
-            Bucket=bucket,
-            Prefix=prefix
+def format_file_sizes(file_sizes):
+    """Format an array of sizes in bytes for display, all at once."""
+    return np.where(
+        file_sizes < 1024,
+        np.char.mod("%d B", file_sizes),
+        np.where(
+            file_sizes < 1024 * 1024,
+            np.char.mod("%.1f KB", file_sizes / 1024),
+            np.char.mod("%.1f MB", file_sizes / (1024 * 1024))
         )
-        
-        # Store file keys and S3 URIs
-        files = []
-        
-        # Process each page of results
-        for page in response_iterator:
-            if 'Contents' in page:
-                for obj in page['Contents']:
-                    key = obj['Key']
-                    # Skip the directory itself and directories
-                    if key != prefix and not key.endswith('/'):
-                        file_name = key.split('/')[-1]
-                        file_uri = f"s3://{bucket}/{key}"
-                        file_size = obj['Size']
-                        # Format the size for display
-                        if file_size < 1024:
-                            size_str = f"{file_size} B"
-                        elif file_size < 1024 * 1024:
-                            size_str = f"{file_size / 1024:.1f} KB"
-                        else:
-                            size_str = f"{file_size / (1024 * 1024):.1f} MB"
-                        
-                        files.append({
-                            "name": file_name, 
-                            "uri": file_uri,
-                            "size": file_size,
-                            "size_str": size_str
-                        })
-        
-        return files
-    except Exception as e:
-        st.error(f"Error listing files from S3: {e}")
-        return []
+    )
+
+def list_s3_objects(s3_client, bucket, prefix):
+    """List every object under a single prefix, one page at a time."""
+    # Use paginator for buckets with many objects
+    paginator = s3_client.get_paginator('list_objects_v2')
+    objects = []
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, PaginationConfig={'PageSize': 1000}):
+        objects.extend(page.get('Contents', []))
+    return objects
+
+def list_s3_objects_parallel(s3_client, bucket, prefix):
+    """List every object under a prefix, fanning out across its sub-prefixes in parallel."""
+    # A delimited listing returns the direct files plus the sub-prefixes to split the work on
+    top_level = s3_client.list_objects_v2(Bucket=bucket, Prefix=prefix, Delimiter='/')
+    
+    # Too many direct children to partition from one page, walk the prefix serially
+    if top_level.get('IsTruncated'):
+        return list_s3_objects(s3_client, bucket, prefix)
+    
+    objects = top_level.get('Contents', [])
+    sub_prefixes = [common['Prefix'] for common in top_level.get('CommonPrefixes', [])]
+    if sub_prefixes:
+        with ThreadPoolExecutor(max_workers=min(16, len(sub_prefixes))) as executor:
+            for sub_objects in executor.map(lambda p: list_s3_objects(s3_client, bucket, p), sub_prefixes):
+                objects.extend(sub_objects)
+    return objects
+
+@st.cache_data(ttl=30, show_spinner=False)
+def list_s3_files(s3_folder_uri):
+    """List all files in an S3 folder, cached briefly to avoid a LIST on every rerun.
+    
+    Errors are raised rather than handled here so a failed listing is never cached.
+    """
+    bucket, prefix = parse_s3_uri(s3_folder_uri)
+    s3_client = get_s3_client()
+    
+    # Ensure the prefix ends with a slash if it's not empty
+    if prefix and not prefix.endswith('/'):
+        prefix += '/'
+    
+    # Keep only file keys and sizes; the prefix already ends in '/', so this also skips the folder itself
+    return [
+        {
+            "name": obj['Key'].split('/')[-1],
+            "uri": f"s3://{bucket}/{obj['Key']}",
+            "size": obj['Size']
+        }
+        for obj in list_s3_objects_parallel(s3_client, bucket, prefix)
+        if not obj['Key'].endswith('/')
+    ]
 
 def save_to_s3(file_content, file_name, s3_folder_uri):
     """Save a file to S3 bucket."""
@@ -234,11 +526,12 @@ def save_to_s3(file_content, file_name, s3_folder_uri):
         # Create the full S3 key
         key = f"{prefix}{file_name}"
         
-        # Upload the file
-        s3_client.put_object(
+        # Upload the file, streaming large files in concurrent multipart chunks
+        s3_client.upload_fileobj(
+            Fileobj=file_content,
             Bucket=bucket,
             Key=key,
-            Body=file_content.getvalue() if hasattr(file_content, 'getvalue') else file_content
+            Config=S3_TRANSFER_CONFIG
         )
         
         return f"s3://{bucket}/{key}"
@@ -253,12 +546,98 @@ def save_uploaded_file(uploaded_file, s3_folder_uri):
         return file_uri
     return None
 
+# Auto-refreshing processing status; only this fragment reruns while a job is running
+@st.fragment(run_every=0.5)
+def processing_status_fragment():
+    """Show the current processing state, re-checking it every half second."""
+    status_data = api_request(f"status/{st.session_state.kickoff_id}")
+    
+    # Stop polling on a failed status call; the error stays visible until Refresh Status
+    if not status_data:
+        st.session_state.processing = False
+        st.session_state.process_state = "STATUS_ERROR"
+        st.rerun()
+    
+    current_state = status_data.get('state', 'UNKNOWN')
+    st.info(f"Current State: {current_state}")
+    
+    # Once execution is finished, rerun the full app so this fragment stops polling
+    if current_state in ["SUCCESS", "FAILURE", "TIMEOUT"]:
+        st.session_state.processing = False
+        st.session_state.process_state = current_state
+        st.rerun()
+
+# Chat section; runs as a fragment so a chat turn only reruns the chat, not the whole page
+@st.fragment
+def chat_fragment():
+    """Render the chat history and handle new messages."""
+    # Display chat history
+    chat_container = st.container()
+    with chat_container:
+        for message in st.session_state.chat_messages:
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
+    
+    # Chat input only triggers a rerun when a message is submitted
+    if current_message := st.chat_input("Ask a question about your documents", key="chat_input"):
+        # Add user message to chat history
+        st.session_state.chat_messages.append({"role": "user", "content": current_message})
+        
+        # Use the persistent session websocket when available, otherwise the HTTP endpoints;
+        # opening a socket starts the chat session, so do it before reading chat_id
+        chat_socket = get_chat_socket()
+        
+        # Prepare API request data
+        if st.session_state.chat_id is None:
+            # Initial message
+            input_data = {
+                "inputs": {
+                    "current_message": current_message
+                }
+            }
+        else:
+            # Follow-up message
+            input_data = {
+                "inputs": {
+                    "current_message": current_message,
+                    "id": st.session_state.chat_id
+                }
+            }
+        
+        # Show the user message right away and stream the AI response below it
+        with chat_container:
+            with st.chat_message("user"):
+                st.markdown(current_message)
+            with st.chat_message("assistant"):
+                try:
+                    if chat_socket:
+                        response_text = st.write_stream(socket_chat(chat_socket, current_message, input_data))
+                    else:
+                        response_text = st.write_stream(stream_chat(input_data))
+                except (requests.exceptions.RequestException, json.JSONDecodeError, WebSocketException, TimeoutError) as e:
+                    # Later turns continue over HTTP with the same chat_id
+                    close_chat_socket()
+                    st.error(f"Streaming response failed: {str(e)}")
+                    response_text = None
+        
+        # Add AI response to chat history; it is already on screen, so no rerun is needed
+        if response_text:
+            st.session_state.chat_messages.append({"role": "assistant", "content": response_text})
+    
+    # Clear chat button
+    if st.button("Clear Chat"):
+        close_chat_socket()
+        st.session_state.chat_messages = []
+        st.session_state.chat_id = None
+        st.rerun(scope="fragment")
+
 # Sidebar content - simplified
 with st.sidebar:
     # Logout button
     st.subheader("Account")
     if st.button("Logout"):
-        # Reset authentication status
+        # Reset authentication status and drop the chat session's websocket
+        close_chat_socket()
         st.session_state["password_correct"] = False
         st.rerun()
 
@@ -277,21 +656,57 @@ with tab1:
     if uploaded_files:
         if st.button("Upload to S3"):
             with st.spinner("Uploading documents to S3..."):
-                for uploaded_file in uploaded_files:
-                    save_uploaded_file(uploaded_file, S3_URI)
+                # Upload files concurrently; workers share the script context so errors still render
+                with ThreadPoolExecutor(
+                    max_workers=min(8, len(uploaded_files)),
+                    initializer=add_script_run_ctx,
+                    initargs=(None, get_script_run_ctx())
+                ) as executor:
+                    file_uris = list(executor.map(lambda f: save_uploaded_file(f, S3_URI), uploaded_files))
+                
+                # Add the new files to the stored listing instead of re-listing the bucket;
+                # without a stored listing, the next rerun lists the bucket anyway
+                if "s3_file_rows" in st.session_state:
+                    uploaded_uris = {file_uri for file_uri in file_uris if file_uri}
+                    rows = [row for row in st.session_state.s3_file_rows if row["uri"] not in uploaded_uris]
+                    for uploaded_file, file_uri in zip(uploaded_files, file_uris):
+                        if file_uri:
+                            rows.append({
+                                "name": uploaded_file.name,
+                                "uri": file_uri,
+                                "size": uploaded_file.size
+                            })
+                    st.session_state.s3_file_rows = rows
+                # Drop the cached listing so other sessions see the new files too
+                list_s3_files.clear()
                 st.session_state.upload_complete = True
                 st.success("Files successfully uploaded to S3!")
                 st.rerun()
     
     # Display files in S3 bucket
     st.subheader("Documents in S3 Bucket")
-    s3_files = list_s3_files(S3_URI)
+    if st.button("Refresh list"):
+        list_s3_files.clear()
+        st.session_state.pop("s3_file_rows", None)
+    
+    # Keep the listing in session state so reruns don't list or format it again;
+    # a failed listing is not stored, so the next rerun tries again
+    if "s3_file_rows" not in st.session_state:
+        try:
+            st.session_state.s3_file_rows = list_s3_files(S3_URI)
+        except Exception as e:
+            st.error(f"Error listing files from S3: {e}")
+    s3_files = st.session_state.get("s3_file_rows")
     
     if s3_files:
-        # Display files with details
-        for file_info in s3_files:
-            st.text(f"{file_info['name']} - {file_info['size_str']}")
-    else:
+        # Display files with details as a single table
+        file_sizes = np.fromiter((file_info["size"] for file_info in s3_files), dtype=np.int64, count=len(s3_files))
+        files_df = pd.DataFrame({
+            "Name": [file_info["name"] for file_info in s3_files],
+            "Size": format_file_sizes(file_sizes)
+        })
+        st.dataframe(files_df, hide_index=True, use_container_width=True)
+    elif s3_files is not None:
         st.info("No documents found in S3 bucket.")
     
     # Upload tab instructions
@@ -319,6 +734,7 @@ with tab2:
     if st.button("Process All Documents", type="primary"):
         st.session_state.processing = True
         st.session_state.kickoff_id = None
+        st.session_state.process_state = None
         
         with st.spinner("Kicking off document processing..."):
             # Prepare input data with S3 URI
@@ -347,10 +763,6 @@ with tab2:
     if st.session_state.kickoff_id:
         st.success(f"Document processing is in progress. Kickoff ID: {st.session_state.kickoff_id}")
         
-        # Create a placeholder for status updates
-        status_container = st.empty()
-        result_container = st.empty()
-        
         # Refresh button
         if st.button("Refresh Status"):
             # Poll for status
@@ -359,50 +771,23 @@ with tab2:
                 status_data = api_request(f"status/{kickoff_id}")
                 
                 if status_data:
-                    current_state = status_data.get('state', 'UNKNOWN')
-                    status_container.info(f"Current State: {current_state}")
+                    st.session_state.process_state = status_data.get('state', 'UNKNOWN')
                     
-                    # Check if execution is complete
-                    if current_state == "SUCCESS":
-                        result_container.success("DONE")
-                        st.session_state.processing = False
+                    # Resume auto-polling until execution is complete
+                    st.session_state.processing = st.session_state.process_state not in ["SUCCESS", "FAILURE", "TIMEOUT"]
                 else:
-                    status_container.error("Failed to retrieve status")
+                    st.session_state.processing = False
+                    st.session_state.process_state = "STATUS_ERROR"
         
         # Auto-polling section
         if st.session_state.processing:
-            with st.spinner("Waiting for processing to complete..."):
-                # Poll for status until complete
-                complete = False
-                attempts = 0
-                max_attempts = 30  # Limit polling to prevent infinite loops
-                
-                while not complete and attempts < max_attempts:
-                    status_data = api_request(f"status/{st.session_state.kickoff_id}")
-                    
-                    if status_data:
-                        current_state = status_data.get('state', 'UNKNOWN')
-                        status_container.info(f"Current State: {current_state}")
-                        
-                        # Check if execution is complete
-                        if current_state == "SUCCESS":
-                            complete = True
-                            result_container.success("DONE")
-                            st.session_state.processing = False
-                            break
-                        
-                        # If still running, wait and try again
-                        time.sleep(0.1)
-                    else:
-                        status_container.error("Failed to retrieve status")
-                        break
-                    
-                    attempts += 1
-                
-                # Handle execution timeout
-                if attempts >= max_attempts and not complete:
-                    status_container.warning("Processing is taking longer than expected.")
-                    st.info(f"You can manually refresh the status to check progress.")
+            processing_status_fragment()
+        elif st.session_state.process_state == "STATUS_ERROR":
+            st.error("Failed to retrieve status. Click **Refresh Status** to try again.")
+        elif st.session_state.process_state:
+            st.info(f"Current State: {st.session_state.process_state}")
+            if st.session_state.process_state == "SUCCESS":
+                st.success("DONE")
     else:
         st.info("No processing has been started yet. Click 'Process All Documents' above to start.")
     
@@ -420,110 +805,4 @@ with tab2:
 # Chat tab
 with tab3:
     st.header("Chat with Documents")
-    
-    # Display chat history
-    chat_container = st.container()
-    with chat_container:
-        for message in st.session_state.chat_messages:
-            if message["role"] == "user":
-                st.markdown(f"<div class='chat-role-user'>You:</div><div class='chat-message'>{message['content']}</div>", unsafe_allow_html=True)
-            else:
-                st.markdown(f"<div class='chat-role-ai'>AI:</div><div class='chat-message'>{message['content']}</div>", unsafe_allow_html=True)
-    
-    # Input for user message with more chatty UI
-    # Create the text input
-    key = f"user_message_{len(st.session_state.chat_messages)}"
-    user_input = st.text_input("  ", key=key, on_change=lambda: setattr(st.session_state, "_submit_clicked", True) if st.session_state.get(key) else None)
-    col1, col2 = st.columns([5, 1])
-    with col2:
-        submit_clicked = st.button("Send")
-        if submit_clicked:
-            st.session_state["_submit_clicked"] = True
-    
-    # Process message when Send is clicked or Enter is pressed
-    if submit_clicked or (user_input and st.session_state.get("_submit_clicked", False)):
-        # Store the current message for processing
-        current_message = user_input
-        # Reset the submit flag
-        st.session_state["_submit_clicked"] = False
-        
-        # Add user message to chat history
-        st.session_state.chat_messages.append({"role": "user", "content": current_message})
-        
-        # Prepare API request data
-        if st.session_state.chat_id is None:
-            # Initial message
-            input_data = {
-                "inputs": {
-                    "current_message": current_message
-                }
-            }
-        else:
-            # Follow-up message
-            input_data = {
-                "inputs": {
-                    "current_message": current_message,
-                    "id": st.session_state.chat_id
-                }
-            }
-        
-        # Two-step API request process
-        with st.spinner("Getting response..."):
-            # Step 1: Kickoff the request to get kickoff_id
-            kickoff_response = api_request("kickoff", method="POST", data=input_data)
-            
-            if kickoff_response and "kickoff_id" in kickoff_response:
-                # Get the kickoff_id from the response
-                kickoff_id = kickoff_response["kickoff_id"]
-                
-                # Step 2: Check status with the kickoff_id
-                # Add a small delay to allow processing
-                time.sleep(0.1)
-                
-                # Poll the status endpoint until we get a result
-                max_retries = 120
-                for i in range(max_retries):
-                    status_response = api_request(f"status/{kickoff_id}", method="GET")
-                    
-                    if status_response and status_response.get("state") == "SUCCESS" and status_response.get("result"):
-                        # Parse the result which is a JSON string
-                        try:
-                            result_str = status_response["result"]
-                            result_data = json.loads(result_str)
-                            
-                            # Extract the actual response and chat ID
-                            response_text = result_data.get("response", "")
-                            chat_id = result_data.get("id")
-                            
-                            # Update the chat_id for future messages
-                            if chat_id:
-                                st.session_state.chat_id = chat_id
-                            
-                            # Add AI response to chat history
-                            st.session_state.chat_messages.append({"role": "assistant", "content": response_text})
-                            break
-                        except json.JSONDecodeError as e:
-                            st.error(f"Error parsing result JSON: {str(e)}")
-                            break
-                    elif status_response and status_response.get("state") in ["FAILURE", "TIMEOUT"]:
-                        st.error(f"Request failed with state: {status_response.get('state')}")
-                        break
-                    elif i == max_retries - 1:
-                        st.error("Timed out waiting for response")
-                    else:
-                        # Wait before trying again
-                        time.sleep(0.1)
-            else:
-                st.error("Failed to get a kickoff ID from the API")
-                if kickoff_response:
-                    st.error(f"Received: {kickoff_response}")
-            
-            # No need to set a flag anymore as we're using a new key each time
-            # Rerun to update the UI with the new messages
-            st.rerun()
-    
-    # Clear chat button
-    if st.button("Clear Chat"):
-        st.session_state.chat_messages = []
-        st.session_state.chat_id = None
-        st.rerun()
+    chat_fragment()